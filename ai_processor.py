@@ -1,7 +1,7 @@
 import os
 import json
 import logging
-from typing import Dict, Tuple, Optional
+from typing import Dict, List, Tuple, Optional
 
 # Prefer new Google GenAI SDK (https://ai.google.dev/gemini-api/docs/quickstart)
 try:
@@ -22,10 +22,20 @@ try:
 except ImportError:
     HAS_OPENAI = False
 
-from config import GEMINI_API_KEY, OPENAI_API_KEY
+from config import GEMINI_API_KEY, OPENAI_API_KEY, PROMPT_TOKEN_BUDGET
+from prompt_builder import truncate_to_tokens
 
 logger = logging.getLogger(__name__)
 
+def parse_intents(text: str) -> List[str]:
+    """Splits a ';'-separated intent string into distinct intents (commas may appear inside one)."""
+    intents = []
+    for part in (text or "").split(";"):
+        part = part.strip()
+        if part and part not in intents:
+            intents.append(part)
+    return intents
+
 class TicketAnalyzer:
     def __init__(self):
         self.mode = "keyword"
@@ -67,6 +77,32 @@ class TicketAnalyzer:
         
         return True, "Error: Unknown mode"
 
+    def analyze_many(self, ticket_text: str, intents: List[str]) -> List[Tuple[bool, str]]:
+        """
+        Classifies the ticket against every intent in a single LLM call.
+        Returns one (is_relevant, summary) per intent, in the same order.
+        """
+        if len(intents) <= 1:
+            return [self.analyze(ticket_text, intents[0] if intents else "")]
+
+        if self.mode == "keyword":
+            return [self._analyze_keyword(ticket_text, intent) for intent in intents]
+
+        prompt = self._construct_multi_prompt(ticket_text, intents)
+        try:
+            if self.mode == "gemini":
+                response_text = self._gemini_generate(
+                    "You are an intelligent ticket classification agent. Return JSON only.", prompt
+                )
+            elif self.mode == "openai":
+                response_text = self._openai_generate(prompt)
+            else:
+                return [(True, "Error: Unknown mode")] * len(intents)
+            return self._parse_multi_json_response(response_text, len(intents))
+        except Exception as e:
+            logger.error(f"{self.mode.capitalize()} Error: {e}")
+            return [(True, f"AI Error: {str(e)}")] * len(intents)
+
     def _analyze_keyword(self, text: str, intent: str) -> Tuple[bool, str]:
         # Simple fallback: check if intent words are in text
         # This is "dumb" but functional without valid keys
@@ -85,8 +121,9 @@ class TicketAnalyzer:
         else:
             return False, "Does not contain intent keywords."
 
-    def _truncate_text(self, text: str, max_chars=4000) -> str:
-        return text[:max_chars] + "..." if len(text) > max_chars else text
+    def _truncate_text(self, text: str, max_tokens=PROMPT_TOKEN_BUDGET) -> str:
+        # Safety net only: PromptBuilder output already fits the budget
+        return truncate_to_tokens(text, max_tokens)
 
     def _analyze_gemini(self, text: str, intent: str) -> Tuple[bool, str]:
         system_instruction = f"""
@@ -108,49 +145,53 @@ class TicketAnalyzer:
         Return JSON only.
         """
         try:
-            if hasattr(self, "_genai_client"):
-                # Google GenAI SDK: https://ai.google.dev/gemini-api/docs/quickstart
-                response = self._genai_client.models.generate_content(
-                    model="gemini-2.0-flash",
-                    contents=prompt,
-                    config=genai_types.GenerateContentConfig(
-                        system_instruction=system_instruction,
-                        response_mime_type="application/json",
-                    ),
-                )
-                return self._parse_json_response(response.text)
-            else:
-                # Legacy google.generativeai
-                model = genai_legacy.GenerativeModel(
-                    model_name="gemini-1.5-flash",
-                    system_instruction=system_instruction,
-                )
-                response = model.generate_content(
-                    prompt,
-                    generation_config={"response_mime_type": "application/json"},
-                )
-                return self._parse_json_response(response.text)
+            return self._parse_json_response(self._gemini_generate(system_instruction, prompt))
         except Exception as e:
             logger.error(f"Gemini Error: {e}")
             return True, f"AI Error: {str(e)}"
 
+    def _gemini_generate(self, system_instruction: str, prompt: str) -> str:
+        if hasattr(self, "_genai_client"):
+            # Google GenAI SDK: https://ai.google.dev/gemini-api/docs/quickstart
+            response = self._genai_client.models.generate_content(
+                model="gemini-2.0-flash",
+                contents=prompt,
+                config=genai_types.GenerateContentConfig(
+                    system_instruction=system_instruction,
+                    response_mime_type="application/json",
+                ),
+            )
+        else:
+            # Legacy google.generativeai
+            model = genai_legacy.GenerativeModel(
+                model_name="gemini-1.5-flash",
+                system_instruction=system_instruction,
+            )
+            response = model.generate_content(
+                prompt,
+                generation_config={"response_mime_type": "application/json"},
+            )
+        return response.text
+
     def _analyze_openai(self, text: str, intent: str) -> Tuple[bool, str]:
         prompt = self._construct_prompt(text, intent)
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo", # Cost effective
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that classifies support tickets."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.0
-            )
-            content = response.choices[0].message.content
-            return self._parse_json_response(content)
+            return self._parse_json_response(self._openai_generate(prompt))
         except Exception as e:
             logger.error(f"OpenAI Error: {e}")
             return True, f"AI Error: {str(e)}"
 
+    def _openai_generate(self, prompt: str) -> str:
+        response = self.client.chat.completions.create(
+            model="gpt-3.5-turbo", # Cost effective
+            messages=[
+                {"role": "system", "content": "You are a helpful assistant that classifies support tickets."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.0
+        )
+        return response.choices[0].message.content
+
     def _construct_prompt(self, text: str, intent: str) -> str:
         truncated = self._truncate_text(text)
         return f"""
@@ -172,6 +213,57 @@ class TicketAnalyzer:
         }}
         """
 
+    def _construct_multi_prompt(self, text: str, intents: List[str]) -> str:
+        truncated = self._truncate_text(text)
+        numbered = "\n".join(f'{i}. "{intent}"' for i, intent in enumerate(intents, 1))
+        return f"""
+        You are an AI assistant helping a user filter support tickets.
+        
+        USER INTENTS:
+        {numbered}
+        
+        TICKET CONTENT:
+        "{truncated}"
+        
+        TASK:
+        For EACH intent above:
+        1. Determine if this ticket is RELEVANT to that intent. Ignore spam or unrelated issues.
+        2. Provide a 1-sentence summary of the ticket context as it relates to that intent.
+        
+        OUTPUT FORMAT (JSON ONLY, one entry per intent, in order):
+        {{
+            "results": [
+                {{"intent": 1, "relevant": boolean, "summary": "string"}}
+            ]
+        }}
+        """
+
+    def _parse_multi_json_response(self, response_text: str, count: int) -> List[Tuple[bool, str]]:
+        try:
+            clean_text = response_text.replace("```json", "").replace("```", "").strip()
+            data = json.loads(clean_text)
+        except json.JSONDecodeError:
+            data = None
+        # Models sometimes return the results list without the wrapping object
+        if isinstance(data, dict):
+            entries = data.get("results") or []
+        elif isinstance(data, list):
+            entries = data
+        else:
+            # Unparseable: the text cannot be attributed to individual intents, so none is marked relevant
+            return [(False, response_text[:100])] * count
+
+        # Intents the reply skipped are not matches (one would otherwise make the whole ticket relevant)
+        results = [(False, "No result returned for this intent.")] * count
+        for pos, entry in enumerate(entries):
+            if not isinstance(entry, dict):
+                continue
+            idx = entry.get("intent", pos + 1)
+            idx = idx - 1 if isinstance(idx, int) else pos
+            if 0 <= idx < count:
+                results[idx] = (entry.get("relevant", True), entry.get("summary", "No summary provided."))
+        return results
+
     def _parse_json_response(self, response_text: str) -> Tuple[bool, str]:
         try:
             # Clean up potential markdown blocks like ```json ... ```
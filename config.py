@@ -9,8 +9,53 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 
-if not FRESHDESK_DOMAIN or not FRESHDESK_API_KEY:
-    print("Warning: FRESHDESK_DOMAIN or FRESHDESK_API_KEY not found in .env file.")
+# Freshdesk API budget (requests per minute, depends on plan) and detail-fetch concurrency
+FRESHDESK_RATE_LIMIT = int(os.getenv("FRESHDESK_RATE_LIMIT", "100"))
+FRESHDESK_MAX_WORKERS = int(os.getenv("FRESHDESK_MAX_WORKERS", "4"))
+
+# Token budget for the ticket text sent to the LLM per ticket
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1000"))
+
+# Background sync of recently updated tickets into a local cache (served to interactive searches)
+SYNC_ENABLED = os.getenv("SYNC_ENABLED", "false").lower() in ("1", "true", "yes")
+SYNC_INTERVAL_MINUTES = int(os.getenv("SYNC_INTERVAL_MINUTES", "15"))
+SYNC_WINDOW_DAYS = int(os.getenv("SYNC_WINDOW_DAYS", "30"))
+SYNC_RATE_SHARE = float(os.getenv("SYNC_RATE_SHARE", "0.3"))
+CACHE_PATH = os.getenv("CACHE_PATH", "ticket_cache.db")
+# Searches fall back to the API once the cache misses two sync rounds
+CACHE_MAX_AGE_MINUTES = 2 * SYNC_INTERVAL_MINUTES
+
+# Saved recurring queries (last run's tickets, for delta reports)
+SAVED_QUERIES_PATH = os.getenv("SAVED_QUERIES_PATH", "saved_queries.db")
+
+# Bot report delivery: one xlsx up to REPORT_XLSX_MAX_ROWS rows and ~REPORT_PART_MAX_MB of text, otherwise compressed parts
+# (REPORT_FORMAT = csv.zip or parquet) capped by rows and size (Telegram bots can upload 50 MB)
+REPORT_XLSX_MAX_ROWS = int(os.getenv("REPORT_XLSX_MAX_ROWS", "5000"))
+REPORT_FORMAT = os.getenv("REPORT_FORMAT", "csv.zip")
+REPORT_PART_ROWS = int(os.getenv("REPORT_PART_ROWS", "20000"))
+REPORT_PART_MAX_MB = int(os.getenv("REPORT_PART_MAX_MB", "45"))
+
+def _parse_accounts(raw):
+    """'domain1:key1,domain2:key2' -> [(domain, key), ...]"""
+    accounts = []
+    for entry in (raw or "").split(","):
+        domain, _, api_key = entry.strip().partition(":")
+        if domain and api_key:
+            accounts.append((domain.strip(), api_key.strip()))
+    return accounts
+
+# Several Freshdesk domains scraped in parallel; defaults to the single domain above
+FRESHDESK_ACCOUNTS = _parse_accounts(os.getenv("FRESHDESK_ACCOUNTS"))
+if not FRESHDESK_ACCOUNTS and FRESHDESK_DOMAIN and FRESHDESK_API_KEY:
+    FRESHDESK_ACCOUNTS = [(FRESHDESK_DOMAIN, FRESHDESK_API_KEY)]
+
+# Per-domain budget for interactive runs: the synced (first) account leaves the sync its share
+INTERACTIVE_RATE_LIMITS = {domain: FRESHDESK_RATE_LIMIT for domain, _ in FRESHDESK_ACCOUNTS}
+if SYNC_ENABLED and FRESHDESK_ACCOUNTS:
+    INTERACTIVE_RATE_LIMITS[FRESHDESK_ACCOUNTS[0][0]] = FRESHDESK_RATE_LIMIT * (1 - SYNC_RATE_SHARE)
+
+if not FRESHDESK_ACCOUNTS:
+    print("Warning: FRESHDESK_DOMAIN or FRESHDESK_API_KEY (or FRESHDESK_ACCOUNTS) not found in .env file.")
     
 if not GEMINI_API_KEY and not OPENAI_API_KEY:
     print("Note: No AI API keys found. 'Intent' filtering will use keyword matching.")
@@ -1,14 +1,77 @@
 import requests
 import base64
 import time
-from typing import List, Dict, Any
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple, Union
+from models import Ticket, Conversation
+
+# `include=conversations` embeds at most this many conversations per ticket
+EMBEDDED_CONVERSATION_LIMIT = 10
+
+
+def keyword_terms(keyword: str) -> List[str]:
+    """Splits a comma-separated keyword into lowercase search terms."""
+    keyword = (keyword or "").strip()
+    terms = [t.strip().lower() for t in keyword.split(",") if t.strip()]
+    return terms or ([keyword.lower()] if keyword else [])
+
+
+def matches_keyword(terms: List[str], subject: str, description: str) -> bool:
+    """True if ANY term appears in the subject or description."""
+    subject = (subject or "").lower()
+    description = str(description or "").lower()
+    return any(term in subject or term in description for term in terms)
+
+
+def changed_ticket_ids(
+    tickets: Iterable[Union[Ticket, Dict[str, Any]]], known_updated_at: Dict[int, str]
+) -> List[int]:
+    """
+    Ids of tickets (listing dicts or compact records) that are new or whose
+    `updated_at` differs from `known_updated_at`.
+    """
+    changed = []
+    for t in tickets:
+        t_id, updated_at = (t.id, t.updated_at) if isinstance(t, Ticket) else (t['id'], t.get('updated_at'))
+        if t_id not in known_updated_at or known_updated_at[t_id] != updated_at:
+            changed.append(t_id)
+    return changed
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket shared by all requests of a client.
+    Allows bursts up to one minute's budget, then paces calls to `per_minute`.
+    """
+    def __init__(self, per_minute: float):
+        self.capacity = max(float(per_minute), 1.0)
+        self.tokens = self.capacity
+        self.refill_rate = self.capacity / 60.0
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.refill_rate
+            time.sleep(wait)
+
 
 class FreshdeskClient:
-    def __init__(self, domain: str, api_key: str):
+    def __init__(self, domain: str, api_key: str, rate_limit: int = 100, max_workers: int = 4):
         self.domain = domain.rstrip('/')
         self.api_key = api_key
         self.base_url = f"https://{self.domain}/api/v2"
         self.session = requests.Session()
+        self.rate_limiter = RateLimiter(rate_limit)
+        self.max_workers = max(1, max_workers)
         
         # Freshdesk requires Basic Auth with API key as username and 'X' as password
         auth_str = f"{self.api_key}:X"
@@ -18,6 +81,17 @@ class FreshdeskClient:
             "Content-Type": "application/json"
         })
 
+    def _get(self, url: str, params: Dict[str, Any] = None) -> requests.Response:
+        """GET within the rate budget, waiting out 429 responses."""
+        while True:
+            self.rate_limiter.acquire()
+            response = self.session.get(url, params=params)
+            if response.status_code == 429:
+                print(f"Rate limit exceeded on {url}. Waiting 60 seconds...")
+                time.sleep(60)
+                continue
+            return response
+
     def _list_tickets(
         self,
         updated_since: str = None,
@@ -25,8 +99,12 @@ class FreshdeskClient:
         order_by: str = None,
         order_type: str = None,
         stop_after_date: str = None,
-    ) -> List[Dict[str, Any]]:
-        """Fetch tickets via list endpoint (GET /tickets)."""
+    ) -> Tuple[Optional[List[Dict[str, Any]]], bool]:
+        """
+        Fetch tickets via list endpoint (GET /tickets).
+        Returns (tickets, complete): tickets is None if a page failed, and complete is
+        False if listing stopped at `max_pages` rather than at the end of the results.
+        """
         all_tickets = []
         page = 1
         url = f"{self.base_url}/tickets"
@@ -38,36 +116,43 @@ class FreshdeskClient:
                 params["order_by"] = order_by
             if order_type:
                 params["order_type"] = order_type
-            response = self.session.get(url, params=params)
-            if response.status_code == 429:
-                print("Rate limit exceeded. Waiting 60 seconds...")
-                time.sleep(60)
-                continue
+            response = self._get(url, params=params)
             if response.status_code != 200:
                 print(f"Error listing tickets page {page}: {response.text}")
-                return []
+                return None, False
             tickets = response.json()
             if not tickets:
-                break
+                return all_tickets, True
             for t in tickets:
                 if stop_after_date:
                     created = (t.get("created_at") or "")[:10]
                     if created and created > stop_after_date:
                         print(f"Fetched {len(all_tickets)} tickets (reached end_date), stopping.")
-                        return all_tickets
+                        return all_tickets, True
                 all_tickets.append(t)
             print(f"Fetched {len(tickets)} tickets from page {page}...")
             if len(tickets) < 100:
-                break
+                return all_tickets, True
             page += 1
             time.sleep(0.5)
-        return all_tickets
+        print(f"Stopped listing at the {max_pages}-page cap; results may be incomplete.")
+        return all_tickets, False
+
+    def list_tickets_updated_since(
+        self, updated_since: str, max_pages: int = 150
+    ) -> Tuple[Optional[List[Dict[str, Any]]], bool]:
+        """
+        Lists every ticket updated at or after `updated_since` (ISO timestamp).
+        Returns (tickets, complete) as `_list_tickets` does.
+        """
+        return self._list_tickets(updated_since=updated_since, max_pages=max_pages)
 
     def search_tickets(self, query: str, start_date: str = None, end_date: str = None) -> List[Dict[str, Any]]:
         """
         Searches for tickets using a keyword and optional date range.
         Uses list tickets API + client-side filtering; the search/tickets query format
         is not reliably supported across Freshdesk instances.
+        Raises RuntimeError if the listing fails, so callers never mistake it for "no matches".
         """
         print(f"Searching for query: '{query}' with Date Range: {start_date} to {end_date}")
         keyword = (query or "").strip()
@@ -97,26 +182,22 @@ class FreshdeskClient:
         else:
             max_pages = 50
 
-        tickets = self._list_tickets(
+        tickets, _ = self._list_tickets(
             updated_since=updated_since,
             max_pages=max_pages,
             order_by=order_by,
             order_type=order_type,
             stop_after_date=stop_after_date,
         )
+        if tickets is None:
+            raise RuntimeError(f"Listing tickets on {self.domain} failed.")
 
         # Filter by keyword (supports comma-separated: match if ANY term appears)
         if keyword:
-            terms = [t.strip().lower() for t in keyword.split(",") if t.strip()]
-            if not terms:
-                terms = [keyword.lower()]
+            terms = keyword_terms(keyword)
             tickets = [
                 t for t in tickets
-                if any(
-                    term in (t.get("subject") or "").lower()
-                    or term in (str(t.get("description") or t.get("description_text") or "")).lower()
-                    for term in terms
-                )
+                if matches_keyword(terms, t.get("subject"), t.get("description") or t.get("description_text"))
             ]
             print(f"Client-side filter: {len(tickets)} tickets match keyword.")
 
@@ -136,23 +217,58 @@ class FreshdeskClient:
 
         return tickets
 
-    def get_ticket_details(self, ticket_id: int) -> Dict[str, Any]:
+    def get_ticket_details(self, ticket_id: int, compact: bool = False) -> Union[Dict[str, Any], Ticket]:
         """
         Fetches full details for a ticket, including conversations.
+        Threads longer than the embedded limit are completed via the conversations endpoint.
+        With `compact=True` the JSON is parsed straight into a `Ticket` record.
         """
         url = f"{self.base_url}/tickets/{ticket_id}"
         params = {"include": "conversations"}
-        
+
+        response = self._get(url, params=params)
+        if response.status_code != 200:
+            print(f"Error fetching ticket {ticket_id}: {response.text}")
+            return None if compact else {}
+
+        ticket = response.json()
+        conversations = None
+        if len(ticket.get('conversations') or []) >= EMBEDDED_CONVERSATION_LIMIT:
+            # Convert page by page so raw conversation pages are not held in compact mode
+            convert = Conversation.from_api if compact else (lambda c: c)
+            conversations = [convert(c) for page in self.iter_conversation_pages(ticket_id) for c in page] or None
+
+        if compact:
+            return Ticket.from_api(ticket, conversations=conversations)
+        if conversations:
+            ticket['conversations'] = conversations
+        return ticket
+
+    def iter_conversation_pages(self, ticket_id: int, per_page: int = 100) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Streams a ticket's conversations page by page (GET /tickets/{id}/conversations).
+        """
+        url = f"{self.base_url}/tickets/{ticket_id}/conversations"
+        page = 1
         while True:
-            response = self.session.get(url, params=params)
-            
-            if response.status_code == 429:
-                print(f"Rate limit exceeded on ticket {ticket_id}. Waiting...")
-                time.sleep(60)
-                continue
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                print(f"Error fetching ticket {ticket_id}: {response.text}")
-                return {}
+            response = self._get(url, params={"page": page, "per_page": per_page})
+            if response.status_code != 200:
+                print(f"Error fetching conversations page {page} of ticket {ticket_id}: {response.text}")
+                return
+            conversations = response.json()
+            if not conversations:
+                return
+            yield conversations
+            if len(conversations) < per_page:
+                return
+            page += 1
+
+    def get_tickets_details(self, ticket_ids: Iterable[int], compact: bool = False) -> Iterator[Tuple[int, Any]]:
+        """
+        Fetches details for many tickets concurrently (bounded by `max_workers` and the
+        shared rate limiter). Yields (ticket_id, details) in input order as they complete.
+        """
+        ticket_ids = list(ticket_ids)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            details = executor.map(lambda t_id: self.get_ticket_details(t_id, compact=compact), ticket_ids)
+            yield from zip(ticket_ids, details)
@@ -1,10 +1,18 @@
 import os
 import sys
+import argparse
 import datetime
-from config import FRESHDESK_DOMAIN, FRESHDESK_API_KEY
-from freshdesk_client import FreshdeskClient
+from config import (
+    FRESHDESK_ACCOUNTS, INTERACTIVE_RATE_LIMITS, FRESHDESK_MAX_WORKERS,
+    CACHE_PATH, CACHE_MAX_AGE_MINUTES, SAVED_QUERIES_PATH,
+)
+from freshdesk_client import FreshdeskClient, changed_ticket_ids
+from sharded_scraper import fetch_all_domains
+from ticket_cache import cached_search
+from saved_queries import SavedQueryStore
 from report_generator import generate_report
-from ai_processor import TicketAnalyzer
+from ai_processor import TicketAnalyzer, parse_intents
+from prompt_builder import PromptBuilder
 
 def get_input(prompt, default=None):
     text = input(prompt)
@@ -13,79 +21,179 @@ def get_input(prompt, default=None):
     return text
 
 def main():
+    parser = argparse.ArgumentParser(description="Freshdesk Smart Scraper")
+    parser.add_argument("--query", help="Run a saved query without prompts (writes a delta report)")
+    parser.add_argument("--full", action="store_true", help="With --query, also write the merged full report")
+    args = parser.parse_args()
+
     print("=== Freshdesk Smart Scraper ===")
     
-    if not FRESHDESK_DOMAIN or not FRESHDESK_API_KEY:
-        print("Error: Please set FRESHDESK_DOMAIN and FRESHDESK_API_KEY in .env file.")
+    if not FRESHDESK_ACCOUNTS:
+        print("Error: Please set FRESHDESK_DOMAIN and FRESHDESK_API_KEY (or FRESHDESK_ACCOUNTS) in .env file.")
         return
 
     # Initialize Clients
-    client = FreshdeskClient(FRESHDESK_DOMAIN, FRESHDESK_API_KEY)
     ai = TicketAnalyzer() # Will init based on keys in .env
+    prompts = PromptBuilder()
+    store = SavedQueryStore(SAVED_QUERIES_PATH)
     
-    # 1. Gather Inputs
-    keyword = get_input("Enter Keyword to Search (e.g. 'refund'): ")
-    start_date = get_input("Enter Start Date (YYYY-MM-DD) [Optional - Press Enter to skip]: ", default="")
-    end_date = get_input("Enter End Date (YYYY-MM-DD) [Optional]: ", default="")
-    intent = get_input("Enter Specific Intent for AI Analysis (e.g. 'Users asking for refunds due to app crash') [Optional]: ", default="")
+    # 1. Gather Inputs (a saved query remembers them and its last run's tickets)
+    query_name = args.query or get_input("Saved Query Name for recurring reports (only new/changed tickets are processed) [Optional]: ", default="")
+    saved = store.get(query_name) if query_name else None
+    if saved:
+        keyword, start_date, end_date, intent = saved['keyword'], saved['start_date'], saved['end_date'], saved['intent']
+        print(f"Using saved query '{query_name}': keyword='{keyword}', dates={start_date or '-'} to {end_date or '-'}, intent='{intent}'")
+    elif args.query:
+        print(f"Saved query '{args.query}' not found. Run interactively once to create it.")
+        return
+    else:
+        keyword = get_input("Enter Keyword to Search (e.g. 'refund'): ")
+        start_date = get_input("Enter Start Date (YYYY-MM-DD) [Optional - Press Enter to skip]: ", default="")
+        end_date = get_input("Enter End Date (YYYY-MM-DD) [Optional]: ", default="")
+        intent = get_input("Enter Specific Intent(s) for AI Analysis, separate several with ';' (e.g. 'Users asking for refunds due to app crash; login bugs') [Optional]: ", default="")
+    intents = parse_intents(intent)
     
     if not keyword:
         print("Keyword is required.")
         return
 
-    # 2. Search
-    print(f"\n--- STEP 1: Searching Freshdesk ---")
-    found_tickets = client.search_tickets(keyword, start_date if start_date else None, end_date if end_date else None)
-    print(f"Total Tickets Found: {len(found_tickets)}")
-    
-    if not found_tickets:
-        print("No tickets found. Exiting.")
-        return
+    start_date = start_date if start_date else None
+    end_date = end_date if end_date else None
+    if query_name and not saved:
+        store.save(query_name, {"keyword": keyword, "start_date": start_date, "end_date": end_date, "intent": intent})
+
+    # {domain ('' for single-domain): {ticket_id: updated_at}} from the query's last run
+    known = store.updated_at_by_domain(query_name) if query_name else {}
+    matched_keys = set()
+    failed_domains = []
+
+    if len(FRESHDESK_ACCOUNTS) > 1:
+        # 2. Search + fetch: each domain runs in its own process (own rate limiter);
+        # tickets are classified as soon as their domain finishes
+        print(f"\n--- STEP 1: Searching {len(FRESHDESK_ACCOUNTS)} Freshdesk domains in parallel ---")
+        shards = fetch_all_domains(
+            FRESHDESK_ACCOUNTS, keyword, start_date, end_date, INTERACTIVE_RATE_LIMITS, FRESHDESK_MAX_WORKERS,
+            known_updated_at=known,
+        )
+
+        # The total grows as domains finish, so progress shows what has arrived so far
+        progress = {"total": 0}
+
+        def sharded_details():
+            received = 0
+            for done, (domain, tickets, matched_ids) in enumerate(shards, 1):
+                if matched_ids is None:
+                    failed_domains.append(domain)
+                    continue
+                matched_keys.update((domain, t_id) for t_id in matched_ids)
+                received += len(tickets)
+                progress["total"] = f"{received} ({done}/{len(FRESHDESK_ACCOUNTS)} domains done)"
+                for t in tickets:
+                    yield t.id, t
+
+        details = sharded_details()
+    else:
+        # 2. Search (served from the local cache when the sync daemon keeps this window warm)
+        domain, api_key = FRESHDESK_ACCOUNTS[0]
+        client = FreshdeskClient(domain, api_key, rate_limit=INTERACTIVE_RATE_LIMITS[domain], max_workers=FRESHDESK_MAX_WORKERS)
+        known_ids = known.get("", {})
+        cached = cached_search(CACHE_PATH, client.domain, keyword, start_date, end_date, CACHE_MAX_AGE_MINUTES)
+        if cached is not None:
+            print(f"\n--- STEP 1: Searching local cache ---")
+            matched_keys = {("", t.id) for t in cached}
+            changed_ids = set(changed_ticket_ids(cached, known_ids))
+            cached = [t for t in cached if t.id in changed_ids]
+            total = len(cached)
+        else:
+            print(f"\n--- STEP 1: Searching Freshdesk ---")
+            try:
+                found_tickets = client.search_tickets(keyword, start_date, end_date)
+            except RuntimeError as e:
+                print(f"Error: {e}")
+                return
+            matched_keys = {("", t['id']) for t in found_tickets}
+            ticket_ids = changed_ticket_ids(found_tickets, known_ids)
+            del found_tickets # listing payloads are not needed past this point
+            total = len(ticket_ids)
+        if query_name:
+            print(f"Total Tickets Found: {len(matched_keys)} ({total} new or changed since the last run)")
+        else:
+            print(f"Total Tickets Found: {total}")
+        
+        if not matched_keys:
+            if query_name:
+                # Nothing matches any more: drop the stored tickets and stamp the run
+                store.record_run(query_name, [], matched_keys)
+            print("No tickets found. Exiting.")
+            return
+
+        # 3A. Fetch full conversations concurrently (within the rate budget), parsed into compact records
+        if cached is not None:
+            details = ((t.id, t) for t in cached)
+        else:
+            details = client.get_tickets_details(ticket_ids, compact=True)
+        progress = {"total": total}
         
     # 3. Process Details + AI Analysis
     detailed_tickets = []
-    total = len(found_tickets)
     
     print(f"\n--- STEP 2: Fetching Details & Analyzing Intent ---")
     print(f"AI Mode: {ai.mode.upper()}")
     
-    for i, ticket in enumerate(found_tickets):
-        t_id = ticket['id']
-        sys.stdout.write(f"\rProcessing {i+1}/{total} (Ticket #{t_id})...")
+    for i, (t_id, full_ticket) in enumerate(details):
+        sys.stdout.write(f"\rProcessing {i+1}/{progress['total']} (Ticket #{t_id})...")
         sys.stdout.flush()
         
-        # A. Fetch full conversation
-        full_ticket = client.get_ticket_details(t_id)
         if not full_ticket:
             continue
             
         # B. AI Analysis
-        # We combine subject + description + conversation for analysis
-        combined_text = f"Subject: {full_ticket.get('subject')}\nDescription: {full_ticket.get('description_text')}\n"
-        # Add a bit of conversation if available
-        for conv in full_ticket.get('conversations', [])[:3]: # limit to first 3 to save tokens
-            combined_text += f"Reply: {conv.get('body_text')}\n"
-            
-        is_relevant, summary = ai.analyze(combined_text, intent)
-        
-        full_ticket['ai_relevant'] = is_relevant
-        full_ticket['ai_summary'] = summary
+        # Subject + description + the most informative replies, packed into the token budget
+        combined_text = prompts.build(full_ticket)
+        # One call classifies the ticket against every intent
+        full_ticket.apply_analysis(intents, ai.analyze_many(combined_text, intents))
         
         # If user wants ONLY relevant tickets, we could filter here. 
         # But usually better to keep all in report and mark them.
         detailed_tickets.append(full_ticket)
 
     print("\nProcessing complete.")
+    for domain in failed_domains:
+        print(f"Warning: {domain} failed and is missing from this run; its saved tickets were kept.")
+    print(prompts.stats_summary())
 
-    # 4. Generate Report
+    # 4. Generate Report(s)
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     clean_kw = "".join([c for c in keyword if c.isalnum()])
-    filename = f"report_{clean_kw}_{timestamp}.xlsx"
-    
-    generate_report(detailed_tickets, filename=filename)
+    written = []
+
+    if detailed_tickets:
+        suffix = "_delta" if query_name else ""
+        filename = f"report_{clean_kw}{suffix}_{timestamp}.xlsx"
+        generate_report(detailed_tickets, filename=filename)
+        written.append(filename)
+    elif query_name:
+        print("No new or changed tickets since the last run.")
+    else:
+        print("No tickets found. Exiting.")
+        return
+
+    if query_name:
+        # Only once the delta report is on disk: recorded tickets count as unchanged from now on
+        store.record_run(query_name, detailed_tickets, matched_keys, failed_domains)
+        full = args.full if args.query else get_input("Also write the merged full report? (y/N): ", default="n").lower().startswith("y")
+        if full:
+            filename = f"report_{clean_kw}_full_{timestamp}.xlsx"
+            generate_report(store.load_tickets(query_name), filename=filename)
+            written.append(filename)
     
-    print(f"\nSUCCESS! Report saved to: {filename}")
-    print("Open the Excel file to see the 'AI Relevance' and 'AI Summary' columns.")
+    for filename in written:
+        print(f"\nSUCCESS! Report saved to: {filename}")
+    if written:
+        if len(intents) > 1:
+            print("Open the Excel file to see the 'Relevance: <intent>' and 'Summary: <intent>' columns.")
+        else:
+            print("Open the Excel file to see the 'AI Relevance' and 'AI Summary' columns.")
 
 if __name__ == "__main__":
     main()
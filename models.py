@@ -0,0 +1,97 @@
+import html
+import re
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+_TAG_RE = re.compile('<.*?>')
+
+def clean_html(raw_html):
+    """
+    Removes HTML tags and unescapes characters for a cleaner text representation.
+    """
+    if not raw_html:
+        return ""
+    cleantext = re.sub(_TAG_RE, '', raw_html)
+    return html.unescape(cleantext)
+
+
+@dataclass(slots=True)
+class Conversation:
+    """A reply or note, keeping one plain-text copy of its body."""
+    user_id: Optional[int]
+    created_at: Optional[str]
+    private: bool
+    text: str
+
+    @classmethod
+    def from_api(cls, data: Dict[str, Any]) -> "Conversation":
+        # Prefer Freshdesk's plain-text rendition; fall back to stripping the HTML body
+        text = data.get('body_text') or clean_html(data.get('body'))
+        return cls(
+            user_id=data.get('user_id'),
+            created_at=data.get('created_at'),
+            private=bool(data.get('private')),
+            text=text or "",
+        )
+
+
+@dataclass(slots=True)
+class Ticket:
+    """
+    Compact ticket record: only the fields used by the report and the AI analysis.
+    Raw HTML, attachments and custom fields are dropped at parse time.
+    """
+    id: int
+    subject: Optional[str]
+    status: Optional[int]
+    priority: Optional[int]
+    responder_id: Optional[int]
+    created_at: Optional[str]
+    updated_at: Optional[str]
+    description: str
+    conversations: List[Conversation] = field(default_factory=list)
+    ai_relevant: Any = 'N/A'
+    ai_summary: str = ''
+    # Per-intent (relevant, summary) when several intents are classified in one pass
+    ai_results: Dict[str, Tuple[Any, str]] = field(default_factory=dict)
+    # Source Freshdesk domain, set in multi-domain runs
+    domain: Optional[str] = None
+
+    @classmethod
+    def from_api(cls, data: Dict[str, Any], conversations: Optional[List[Conversation]] = None) -> "Ticket":
+        """Builds a record from ticket JSON; `conversations` overrides the embedded ones."""
+        if conversations is None:
+            conversations = [Conversation.from_api(c) for c in data.get('conversations') or []]
+        return cls(
+            id=data.get('id'),
+            subject=data.get('subject'),
+            status=data.get('status'),
+            priority=data.get('priority'),
+            responder_id=data.get('responder_id'),
+            created_at=data.get('created_at'),
+            updated_at=data.get('updated_at'),
+            description=clean_html(data.get('description_text') or data.get('description') or ""),
+            conversations=conversations,
+            ai_relevant=data.get('ai_relevant', 'N/A'),
+            ai_summary=data.get('ai_summary', ''),
+            ai_results=data.get('ai_results') or {},
+            domain=data.get('domain'),
+        )
+
+    def apply_analysis(self, intents: List[str], results: List[Tuple[Any, str]]):
+        """Stores `TicketAnalyzer.analyze_many` output; relevance is 'any intent' for multi-intent runs."""
+        if len(intents) > 1:
+            self.ai_results = dict(zip(intents, results))
+            self.ai_relevant = any(relevant for relevant, _ in results)
+        else:
+            self.ai_relevant, self.ai_summary = results[0]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Ticket":
+        """Inverse of `to_dict` (used for the local cache)."""
+        data = dict(data)
+        data['conversations'] = [Conversation(**c) for c in data.get('conversations') or []]
+        return cls(**data)
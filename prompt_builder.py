@@ -0,0 +1,193 @@
+import re
+from typing import Dict, Optional, Set
+
+# Exact counts with tiktoken when installed; otherwise ~4 characters per token
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+    HAS_TIKTOKEN = True
+except Exception:
+    _ENCODING = None
+    HAS_TIKTOKEN = False
+
+from config import PROMPT_TOKEN_BUDGET
+from models import Ticket
+
+CHARS_PER_TOKEN = 4
+# Segments that would be cut below this many tokens are dropped instead
+MIN_SEGMENT_TOKENS = 20
+# A sign-off only starts a signature when at most this many lines follow it
+SIGNATURE_MAX_LINES = 4
+ELLIPSIS = "..."
+
+# Start of quoted history: everything after it repeats earlier messages
+_QUOTE_HEADER_RE = re.compile(
+    r'^(on .{0,200} wrote:?|-{2,}\s*original message\s*-{2,}|_{5,})$', re.IGNORECASE
+)
+# Outlook-style quote header: a "From:" line directly followed by another header field
+_FROM_HEADER_RE = re.compile(r'^from:\s.+$', re.IGNORECASE)
+_HEADER_FIELD_RE = re.compile(r'^(sent|date|to|cc|subject):\s', re.IGNORECASE)
+# Start of a signature block or mobile footer
+_SIGNATURE_RE = re.compile(
+    r'^(--|(best |kind |warm )?regards,?|thanks( and regards)?,?|thank you,?|cheers,?|sincerely,?|sent from my .+)$',
+    re.IGNORECASE
+)
+# Whole boilerplate lines (legal disclaimers, unsubscribe and no-reply footers); anchored so
+# customer text that merely mentions unsubscribing is kept
+_BOILERPLATE_RE = re.compile(
+    r'^(this (e-?mail|message)( and any attachments)? (is|are|may be|contains?) .*(confidential|intended)'
+    r'|(to )?unsubscribe\b.*\b(click|here|link)'
+    r'|click (here|below) to unsubscribe'
+    r'|(please )?do not reply to this (e-?mail|message))',
+    re.IGNORECASE
+)
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    if HAS_TIKTOKEN:
+        return len(_ENCODING.encode(text))
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cuts `text` so that it, including the trailing ellipsis, fits in `max_tokens`."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    keep = max_tokens - count_tokens(ELLIPSIS)
+    if keep <= 0:
+        return ""
+    if not HAS_TIKTOKEN:
+        return text[:keep * CHARS_PER_TOKEN] + ELLIPSIS
+    tokens = _ENCODING.encode(text)
+    # Re-encoding the cut text can merge tokens differently, so shrink until it fits
+    while keep > 0:
+        truncated = _ENCODING.decode(tokens[:keep]) + ELLIPSIS
+        if count_tokens(truncated) <= max_tokens:
+            return truncated
+        keep -= 1
+    return ""
+
+
+def clean_message(text: str, seen_lines: Set[str]) -> str:
+    """
+    Strips quoted replies, trailing signatures, boilerplate and lines already seen
+    earlier in the thread (`seen_lines` is shared across the thread).
+    """
+    lines = [line.strip() for line in (text or "").splitlines()]
+    lines = [line for line in lines if line and not line.startswith('>')]
+    end = len(lines)
+    for i, line in enumerate(lines):
+        if _QUOTE_HEADER_RE.match(line) or (
+            _FROM_HEADER_RE.match(line) and i + 1 < len(lines) and _HEADER_FIELD_RE.match(lines[i + 1])
+        ):
+            end = i
+            break
+
+    kept = []
+    for i, stripped in enumerate(lines[:end]):
+        if _SIGNATURE_RE.match(stripped):
+            # "Thanks," opening a paragraph is not a signature; one followed only by a name is
+            if end - i - 1 <= SIGNATURE_MAX_LINES:
+                break
+            continue
+        if _BOILERPLATE_RE.match(stripped):
+            continue
+        key = " ".join(stripped.lower().split())
+        if key in seen_lines:
+            continue
+        seen_lines.add(key)
+        kept.append(stripped)
+    return "\n".join(kept)
+
+
+class PromptBuilder:
+    """
+    Builds the ticket text sent to the LLM within a token budget and keeps
+    running totals of raw vs. prompt tokens for the run.
+    """
+    def __init__(self, token_budget: int = PROMPT_TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self.tickets = 0
+        self.raw_tokens = 0
+        self.prompt_tokens = 0
+
+    def build(self, ticket: Ticket) -> str:
+        raw_text = "\n".join([ticket.subject or "", ticket.description] + [c.text for c in ticket.conversations])
+
+        seen = set()
+        header = f"Subject: {ticket.subject}"
+        description = clean_message(ticket.description, seen)
+        messages = []
+        for conv in ticket.conversations:
+            body = clean_message(conv.text, seen)
+            if body:
+                messages.append(("Note" if conv.private else "Reply", body))
+
+        # Priority: the original request, the latest message (current state), then the rest oldest-first
+        order = [None]
+        if messages:
+            order.append(len(messages) - 1)
+            order.extend(range(len(messages) - 1))
+
+        # Every segment is charged its joining newline, and each picked message room
+        # for an "[N messages omitted]" marker in front of it (plus one at the end)
+        marker_tokens = count_tokens(f"\n[{len(messages)} messages omitted]")
+        remaining = self.token_budget - (marker_tokens if messages else 0)
+        header = truncate_to_tokens(header, remaining)
+        remaining -= count_tokens(header)
+        picked = {}
+        for idx in order:
+            label, body = ("Description", description) if idx is None else messages[idx]
+            segment = f"{label}: {body}"
+            overhead = count_tokens("\n") + (0 if idx is None else marker_tokens)
+            tokens = count_tokens(segment)
+            if tokens + overhead > remaining:
+                if remaining - overhead < MIN_SEGMENT_TOKENS:
+                    continue
+                segment = truncate_to_tokens(segment, remaining - overhead)
+                tokens = count_tokens(segment)
+            picked[idx] = segment
+            remaining -= tokens + overhead
+
+        prompt = self._assemble(header, picked, len(messages))
+        # Token counts are not strictly additive under BPE; drop the lowest-priority segments if over
+        for idx in reversed(order):
+            if count_tokens(prompt) <= self.token_budget:
+                break
+            if picked.pop(idx, None) is not None:
+                prompt = self._assemble(header, picked, len(messages))
+        # Budgets smaller than the header and a marker
+        prompt = truncate_to_tokens(prompt, self.token_budget)
+
+        self.tickets += 1
+        self.raw_tokens += count_tokens(raw_text)
+        self.prompt_tokens += count_tokens(prompt)
+        return prompt
+
+    @staticmethod
+    def _assemble(header: str, picked: Dict[Optional[int], str], message_count: int) -> str:
+        parts = [header]
+        if None in picked:
+            parts.append(picked[None])
+        omitted = 0
+        for idx in range(message_count):
+            if idx in picked:
+                if omitted:
+                    parts.append(f"[{omitted} messages omitted]")
+                    omitted = 0
+                parts.append(picked[idx])
+            else:
+                omitted += 1
+        if omitted:
+            parts.append(f"[{omitted} messages omitted]")
+        return "\n".join(parts)
+
+    def stats_summary(self) -> str:
+        saved = max(self.raw_tokens - self.prompt_tokens, 0)
+        pct = (100.0 * saved / self.raw_tokens) if self.raw_tokens else 0.0
+        return (
+            f"Prompt tokens: {self.prompt_tokens} sent for {self.raw_tokens} raw "
+            f"across {self.tickets} tickets ({saved} saved, {pct:.0f}%)"
+        )
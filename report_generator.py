@@ -1,70 +1,129 @@
+import csv
+import io
+import os
+import zipfile
 import pandas as pd
-from typing import List, Dict, Any
-import html
-import re
+from typing import List, Dict, Any, Iterable, Iterator, Union
+from models import Ticket, clean_html
 
-def clean_html(raw_html):
-    """
-    Removes HTML tags and unescapes characters for a cleaner text representation.
-    """
-    if not raw_html:
-        return ""
-    cleanr = re.compile('<.*?>')
-    cleantext = re.sub(cleanr, '', raw_html)
-    return html.unescape(cleantext)
+# Parquet output needs pyarrow; without it large reports fall back to zipped CSV
+try:
+    import pyarrow
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
 
-def generate_report(tickets: List[Dict[str, Any]], filename: str = "freshdesk_report.xlsx"):
+def _report_rows(tickets: Iterable[Union[Ticket, Dict[str, Any]]]) -> Iterator[Dict[str, Any]]:
     """
-    Converts a list of ticket objects (with nested conversations) into a flattened Excel file.
+    Flattens tickets (compact records or raw API dicts) into report rows, one at a time.
     """
-    processed_data = []
-
     for ticket in tickets:
-        ticket_id = ticket.get('id')
-        subject = ticket.get('subject')
-        
-        # 'description' is the initial message (usually)
-        description_html = ticket.get('description_text') or ticket.get('description') or ""
-        initial_message = clean_html(description_html)
-        
-        # Process conversations (replies/notes)
-        conversations = ticket.get('conversations', [])
-        conversation_text = ""
-        
+        if not isinstance(ticket, Ticket):
+            ticket = Ticket.from_api(ticket)
+
         # Sort by creation date if needed, but usually api returns in order
         # Let's format the conversation history cleanly
-        full_thread = [f"--- ORIGINAL MESSAGE [{ticket.get('created_at')}] ---\n{initial_message}\n"]
-        
-        for conv in conversations:
-            c_type = "REPLY" if not conv.get('private') else "NOTE"
-            c_from = conv.get('user_id') # Ideally we map this to a name if we had the user map, but ID is fallback
-            c_body = clean_html(conv.get('body') or conv.get('body_text') or "")
-            c_time = conv.get('created_at')
-            
-            entry = f"\n--- {c_type} from {c_from} at {c_time} ---\n{c_body}\n"
+        full_thread = [f"--- ORIGINAL MESSAGE [{ticket.created_at}] ---\n{ticket.description}\n"]
+
+        for conv in ticket.conversations:
+            c_type = "REPLY" if not conv.private else "NOTE"
+            c_from = conv.user_id # Ideally we map this to a name if we had the user map, but ID is fallback
+
+            entry = f"\n--- {c_type} from {c_from} at {conv.created_at} ---\n{conv.text}\n"
             full_thread.append(entry)
-            
+
         final_thread_text = "\n".join(full_thread)
-            
-        # Add AI analysis if present
-        ai_relevant = ticket.get('ai_relevant', 'N/A')
-        ai_summary = ticket.get('ai_summary', '')
-        
-        processed_data.append({
-            "Ticket ID": ticket_id,
-            "Subject": subject,
-            "Status": ticket.get('status'),
-            "Priority": ticket.get('priority'),
-            "Agent ID": ticket.get('responder_id'),
-            "Created At": ticket.get('created_at'),
-            "AI Relevance": ai_relevant,
-            "AI Summary": ai_summary,
-            "Full Conversation": final_thread_text
+
+        row = {"Domain": ticket.domain} if ticket.domain else {}
+        row.update({
+            "Ticket ID": ticket.id,
+            "Subject": ticket.subject,
+            "Status": ticket.status,
+            "Priority": ticket.priority,
+            "Agent ID": ticket.responder_id,
+            "Created At": ticket.created_at,
+            "AI Relevance": ticket.ai_relevant,
         })
-        
-    df = pd.DataFrame(processed_data)
-    
+        if ticket.ai_results:
+            # One relevance/summary column pair per intent
+            for intent, (relevant, summary) in ticket.ai_results.items():
+                row[f"Relevance: {intent}"] = relevant
+                row[f"Summary: {intent}"] = summary
+        else:
+            row["AI Summary"] = ticket.ai_summary
+        row["Full Conversation"] = final_thread_text
+        yield row
+
+def generate_report(tickets: List[Union[Ticket, Dict[str, Any]]], filename: str = "freshdesk_report.xlsx"):
+    """
+    Converts a list of tickets (compact records or raw API dicts) into a flattened Excel file.
+    """
+    df = pd.DataFrame(list(_report_rows(tickets)))
+
     # Save to Excel
     print(f"Saving report with {len(df)} records to {filename}...")
     df.to_excel(filename, index=False)
     print("Done.")
+
+def _row_size(row: Dict[str, Any]) -> int:
+    # Uncompressed size estimate; compressed parts always come out smaller
+    return sum(len(str(v)) + 1 for v in row.values())
+
+def fits_single_report(tickets: Iterable[Union[Ticket, Dict[str, Any]]], max_rows: int, max_bytes: int) -> bool:
+    """
+    True if the report stays within `max_rows` rows and ~`max_bytes` of uncompressed
+    data (the same estimate the parts use), i.e. it can be sent as one xlsx.
+    """
+    size = 0
+    for count, row in enumerate(_report_rows(tickets), 1):
+        size += _row_size(row)
+        if count > max_rows or size > max_bytes:
+            return False
+    return True
+
+def _chunk_rows(rows: Iterable[Dict[str, Any]], max_rows: int, max_bytes: int) -> Iterator[List[Dict[str, Any]]]:
+    chunk, size = [], 0
+    for row in rows:
+        chunk.append(row)
+        size += _row_size(row)
+        if len(chunk) >= max_rows or size >= max_bytes:
+            yield chunk
+            chunk, size = [], 0
+    if chunk:
+        yield chunk
+
+def _write_csv_zip(rows: List[Dict[str, Any]], path: str, member: str):
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        with archive.open(member, "w") as raw:
+            stream = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+            writer = csv.DictWriter(stream, fieldnames=list(rows[0]), restval="", extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+            stream.flush()
+            stream.detach()
+
+def generate_report_parts(
+    tickets: Iterable[Union[Ticket, Dict[str, Any]]],
+    base_name: str,
+    fmt: str = "csv.zip",
+    max_rows: int = 20000,
+    max_bytes: int = 45 * 1024 * 1024,
+) -> Iterator[str]:
+    """
+    Writes the report as numbered compressed parts (`csv.zip` or `parquet`) and yields
+    each file path as soon as it is complete, so delivery can start before the rest is built.
+    A part is closed once it reaches `max_rows` rows or ~`max_bytes` of uncompressed data.
+    """
+    if fmt == "parquet" and not HAS_PYARROW:
+        print("pyarrow not installed; writing zipped CSV parts instead of Parquet.")
+        fmt = "csv.zip"
+
+    for part, rows in enumerate(_chunk_rows(_report_rows(tickets), max_rows, max_bytes), 1):
+        if fmt == "parquet":
+            path = f"{base_name}_part{part}.parquet"
+            pd.DataFrame(rows).to_parquet(path, index=False)
+        else:
+            path = f"{base_name}_part{part}.csv.zip"
+            _write_csv_zip(rows, path, f"{os.path.basename(base_name)}_part{part}.csv")
+        print(f"Report part {part} written: {path} ({len(rows)} rows).")
+        yield path
@@ -0,0 +1,105 @@
+import json
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from models import Ticket
+from ticket_cache import TIMESTAMP_FORMAT
+
+
+class SavedQueryStore:
+    """
+    SQLite store of recurring queries: their parameters plus the ticket records
+    (with `updated_at` and AI results) from the last run, so the next run only
+    fetches and classifies new or changed tickets.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS queries ("
+                "name TEXT PRIMARY KEY, params TEXT NOT NULL, last_run_at TEXT)"
+            )
+            # domain is '' for single-domain runs; ticket ids are only unique per domain
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS query_tickets ("
+                "name TEXT, domain TEXT, ticket_id INTEGER, updated_at TEXT, data TEXT NOT NULL, "
+                "PRIMARY KEY (name, domain, ticket_id))"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn: # commits on success
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        """Returns the saved parameters (keyword, start_date, end_date, intent) or None."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT params FROM queries WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, name: str, params: Dict[str, Any]):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO queries (name, params) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET params = excluded.params",
+                (name, json.dumps(params)),
+            )
+
+    def updated_at_by_domain(self, name: str) -> Dict[str, Dict[int, str]]:
+        """{domain: {ticket_id: updated_at}} as of the last run."""
+        known = {}
+        with self._connect() as conn:
+            for domain, ticket_id, updated_at in conn.execute(
+                "SELECT domain, ticket_id, updated_at FROM query_tickets WHERE name = ?", (name,)
+            ):
+                known.setdefault(domain, {})[ticket_id] = updated_at
+        return known
+
+    def record_run(
+        self,
+        name: str,
+        tickets: Iterable[Ticket],
+        matched_keys: Iterable[Tuple[str, int]],
+        failed_domains: Iterable[str] = (),
+    ):
+        """
+        Stores this run's new/changed tickets, drops tickets the query no longer matches
+        (`matched_keys` holds every (domain, ticket_id) found this run) and stamps the run time.
+        Tickets of `failed_domains` are kept as they are: nothing is known about them this run.
+        """
+        rows = [
+            (name, t.domain or "", t.id, t.updated_at, json.dumps(t.to_dict()))
+            for t in tickets
+        ]
+        matched_keys = set(matched_keys)
+        failed_domains = set(failed_domains)
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO query_tickets VALUES (?, ?, ?, ?, ?)", rows)
+            stale = [
+                (name, domain, ticket_id)
+                for domain, ticket_id in conn.execute(
+                    "SELECT domain, ticket_id FROM query_tickets WHERE name = ?", (name,)
+                )
+                if (domain, ticket_id) not in matched_keys and domain not in failed_domains
+            ]
+            conn.executemany("DELETE FROM query_tickets WHERE name = ? AND domain = ? AND ticket_id = ?", stale)
+            conn.execute(
+                "UPDATE queries SET last_run_at = ? WHERE name = ?",
+                (datetime.now(timezone.utc).strftime(TIMESTAMP_FORMAT), name),
+            )
+
+    def load_tickets(self, name: str) -> List[Ticket]:
+        """All stored records of the query (new, changed and unchanged) for the merged full report."""
+        with self._connect() as conn:
+            return [
+                Ticket.from_dict(json.loads(data))
+                for (data,) in conn.execute(
+                    "SELECT data FROM query_tickets WHERE name = ? ORDER BY domain, ticket_id", (name,)
+                )
+            ]
@@ -0,0 +1,75 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from freshdesk_client import FreshdeskClient, changed_ticket_ids
+from models import Ticket
+
+
+def fetch_domain_tickets(
+    domain: str,
+    api_key: str,
+    keyword: str,
+    start_date: Optional[str],
+    end_date: Optional[str],
+    rate_limit: int,
+    max_workers: int,
+    known_updated_at: Optional[Dict[int, str]] = None,
+) -> Tuple[List[Ticket], List[int]]:
+    """
+    Search + detail fetch for one Freshdesk domain, with its own client and rate limiter.
+    Runs in a worker process; settings are passed in so the child does not re-read config.
+    Tickets whose `updated_at` matches `known_updated_at` (a saved query's last run) are
+    not fetched. Returns (fetched tickets, ids of every matching ticket).
+    """
+    client = FreshdeskClient(domain, api_key, rate_limit=rate_limit, max_workers=max_workers)
+    found_tickets = client.search_tickets(keyword, start_date, end_date)
+    matched_ids = [t['id'] for t in found_tickets]
+    ticket_ids = changed_ticket_ids(found_tickets, known_updated_at or {})
+    del found_tickets
+
+    tickets = []
+    for _, record in client.get_tickets_details(ticket_ids, compact=True):
+        if record:
+            record.domain = domain
+            tickets.append(record)
+    return tickets, matched_ids
+
+
+def fetch_all_domains(
+    accounts: List[Tuple[str, str]],
+    keyword: str,
+    start_date: Optional[str],
+    end_date: Optional[str],
+    rate_limits: Dict[str, float],
+    max_workers: int,
+    known_updated_at: Optional[Dict[str, Dict[int, str]]] = None,
+) -> Iterator[Tuple[str, List[Ticket], Optional[List[int]]]]:
+    """
+    Scrapes every (domain, api_key) in its own process. Yields (domain, tickets, matched_ids)
+    as each domain finishes, so a slow instance does not hold up the others.
+    `matched_ids` is None when the domain failed (as opposed to matching nothing).
+    `rate_limits` maps domain -> requests per minute for its client.
+    `known_updated_at` maps domain -> {ticket_id: updated_at} to skip unchanged tickets.
+    """
+    known_updated_at = known_updated_at or {}
+    # spawn: the bot calls this from an executor thread, where fork is unsafe
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=len(accounts), mp_context=context) as pool:
+        futures = {
+            pool.submit(
+                fetch_domain_tickets, domain, api_key, keyword, start_date, end_date,
+                rate_limits[domain], max_workers, known_updated_at.get(domain),
+            ): domain
+            for domain, api_key in accounts
+        }
+        for future in as_completed(futures):
+            domain = futures[future]
+            try:
+                tickets, matched_ids = future.result()
+            except Exception as e:
+                print(f"Error scraping {domain}: {e}")
+                yield domain, [], None
+                continue
+            print(f"{domain}: {len(tickets)} tickets fetched.")
+            yield domain, tickets, matched_ids
@@ -0,0 +1,113 @@
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+
+from config import (
+    FRESHDESK_ACCOUNTS, FRESHDESK_RATE_LIMIT, FRESHDESK_MAX_WORKERS,
+    SYNC_INTERVAL_MINUTES, SYNC_WINDOW_DAYS, SYNC_RATE_SHARE, CACHE_PATH,
+)
+from freshdesk_client import FreshdeskClient, changed_ticket_ids
+from ticket_cache import TicketCache, TIMESTAMP_FORMAT
+
+logger = logging.getLogger(__name__)
+
+# Re-list a little before the previous sync so tickets updated mid-sync are not missed
+OVERLAP_MINUTES = 5
+UPSERT_BATCH = 100
+
+
+def sync_once(client: FreshdeskClient, cache: TicketCache, window_days: int) -> int:
+    """
+    Pulls tickets updated since the last sync (or the whole window on first run),
+    fetches details only for new/changed ones and drops tickets that left the window.
+    The sync is only recorded (making the cache eligible for searches) when the listing
+    ran to completion and every detail fetch succeeded. Returns the number of tickets written.
+    """
+    now = datetime.now(timezone.utc)
+    # The window starts at UTC midnight so its first day is fully cached
+    window_start = (now - timedelta(days=window_days)).replace(hour=0, minute=0, second=0).strftime(TIMESTAMP_FORMAT)
+    synced_domain = cache.synced_domain()
+    if synced_domain and synced_domain != client.domain:
+        # Ticket ids are per domain: start over rather than mix two domains' tickets
+        logger.info(f"Sync domain changed from {synced_domain} to {client.domain}; clearing the cache.")
+        cache.clear()
+    prev_window_start, last_synced_at = cache.sync_state()
+
+    since = window_start
+    if last_synced_at and prev_window_start and prev_window_start <= window_start:
+        last = datetime.strptime(last_synced_at, TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc)
+        since = max(window_start, (last - timedelta(minutes=OVERLAP_MINUTES)).strftime(TIMESTAMP_FORMAT))
+
+    listed, complete = client.list_tickets_updated_since(since)
+    if listed is None:
+        raise RuntimeError(f"Listing tickets updated since {since} failed.")
+    known = cache.updated_at_by_id()
+    changed_ids = changed_ticket_ids(listed, known)
+    del listed, known
+
+    written = 0
+    failed = 0
+    batch = []
+    for _, record in client.get_tickets_details(changed_ids, compact=True):
+        if record:
+            batch.append(record)
+        else:
+            failed += 1
+        if len(batch) >= UPSERT_BATCH:
+            cache.upsert(batch)
+            written += len(batch)
+            batch = []
+    cache.upsert(batch)
+    written += len(batch)
+
+    pruned = cache.prune(window_start)
+    if complete and not failed:
+        cache.mark_synced(window_start, now.strftime(TIMESTAMP_FORMAT), client.domain)
+    else:
+        # Leave the sync state alone so searches keep going to the API and the next sync retries
+        reason = "listing hit the page cap" if not complete else f"{failed} ticket fetches failed"
+        logger.warning(f"Sync incomplete ({reason}); cache not marked as synced.")
+    logger.info(f"Sync: {written} tickets updated, {pruned} pruned (since {since}).")
+    return written
+
+
+def run_sync_loop(stop_event: threading.Event = None):
+    """
+    Syncs every SYNC_INTERVAL_MINUTES using SYNC_RATE_SHARE of the API budget.
+    Only the first account is synced: the cache serves single-domain searches.
+    """
+    stop_event = stop_event or threading.Event()
+    if not FRESHDESK_ACCOUNTS:
+        logger.error("Sync Error: no Freshdesk account configured.")
+        return
+    domain, api_key = FRESHDESK_ACCOUNTS[0]
+    client = FreshdeskClient(
+        domain, api_key,
+        rate_limit=FRESHDESK_RATE_LIMIT * SYNC_RATE_SHARE, max_workers=FRESHDESK_MAX_WORKERS,
+    )
+    cache = TicketCache(CACHE_PATH)
+    while not stop_event.is_set():
+        try:
+            sync_once(client, cache, SYNC_WINDOW_DAYS)
+        except Exception as e:
+            logger.error(f"Sync Error: {e}")
+        stop_event.wait(SYNC_INTERVAL_MINUTES * 60)
+
+
+def start_background_sync() -> threading.Thread:
+    """Runs the sync loop in a daemon thread of the current (bot worker) process."""
+    thread = threading.Thread(target=run_sync_loop, name="ticket-sync", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    if not FRESHDESK_ACCOUNTS:
+        print("Error: Please set FRESHDESK_DOMAIN and FRESHDESK_API_KEY (or FRESHDESK_ACCOUNTS) in .env file.")
+        exit(1)
+    print(f"Syncing last {SYNC_WINDOW_DAYS} days into {CACHE_PATH} every {SYNC_INTERVAL_MINUTES} minutes...")
+    run_sync_loop()
@@ -3,10 +3,18 @@ import os
 import datetime
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
 from telegram.ext import ApplicationBuilder, ContextTypes, CommandHandler, MessageHandler, ConversationHandler, filters
-from config import TELEGRAM_BOT_TOKEN, FRESHDESK_DOMAIN, FRESHDESK_API_KEY
+from config import (
+    TELEGRAM_BOT_TOKEN, FRESHDESK_ACCOUNTS, INTERACTIVE_RATE_LIMITS, FRESHDESK_MAX_WORKERS,
+    SYNC_ENABLED, CACHE_PATH, CACHE_MAX_AGE_MINUTES,
+    REPORT_XLSX_MAX_ROWS, REPORT_FORMAT, REPORT_PART_ROWS, REPORT_PART_MAX_MB,
+)
 from freshdesk_client import FreshdeskClient
-from report_generator import generate_report
-from ai_processor import TicketAnalyzer
+from sharded_scraper import fetch_all_domains
+from ticket_cache import cached_search
+from sync_daemon import start_background_sync
+from report_generator import fits_single_report, generate_report, generate_report_parts
+from ai_processor import TicketAnalyzer, parse_intents
+from prompt_builder import PromptBuilder
 
 # Enable logging; suppress httpx/httplib INFO so token isn't logged in request URLs
 logging.basicConfig(
@@ -55,7 +63,9 @@ async def dates_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data['end_date'] = end_date
     
     await update.message.reply_text(
-        "What should the AI look for? Describe the type of tickets (e.g. users asking about login bugs, refund requests). Type skip to analyze all."
+        "What should the AI look for? Describe the type of tickets (e.g. users asking about login bugs). "
+        "Separate several intents with ; to check them all in one pass (e.g. refund requests; login bugs; API outage). "
+        "Type skip to analyze all."
     )
     return INTENT
 
@@ -75,14 +85,30 @@ async def intent_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # NOTE: In a high-scale prod app, use proper worker queues (Celery/Redis).
         # For this tool, running in an executor is sufficient.
         loop = asyncio.get_running_loop()
-        file_path = await loop.run_in_executor(None, run_scraper_logic, context.user_data)
+        tickets, failed_domains = await loop.run_in_executor(None, run_scraper_logic, context.user_data)
+        base_name = report_base_name(context.user_data['keyword'])
+        single = tickets and await loop.run_in_executor(
+            None, fits_single_report, tickets, REPORT_XLSX_MAX_ROWS, REPORT_PART_MAX_MB * 1024 * 1024,
+        )
         
-        if file_path:
-            await update.message.reply_document(document=open(file_path, 'rb'), filename=os.path.basename(file_path))
+        if failed_domains:
+            await update.message.reply_text(
+                f"Could not search {', '.join(failed_domains)}; tickets from there are missing from this report."
+            )
+        if not tickets and len(failed_domains) == len(FRESHDESK_ACCOUNTS):
+            await update.message.reply_text("Every Freshdesk domain failed, so no report was made. Please try again later.")
+        elif not tickets:
+            await update.message.reply_text("No tickets found for that keyword and date range.")
+        elif single:
+            file_path = f"{base_name}.xlsx"
+            await loop.run_in_executor(None, generate_report, tickets, file_path)
+            await send_file(update, file_path)
             await update.message.reply_text("Done. Here's your report.")
-            os.remove(file_path) # Cleanup
         else:
-            await update.message.reply_text("No tickets found for that keyword and date range.")
+            # Too many rows or too much text for one xlsx: compressed parts, uploaded while later parts are still being written
+            await update.message.reply_text(f"{len(tickets)} tickets found. Sending the report in parts...")
+            parts = await send_report_parts(update, tickets, base_name)
+            await update.message.reply_text(f"Done. Your report was sent in {parts} parts.")
             
     except Exception as e:
         logger.error(f"Error: {e}")
@@ -90,6 +116,46 @@ async def intent_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     return ConversationHandler.END
 
+async def send_file(update: Update, file_path: str):
+    try:
+        with open(file_path, 'rb') as document:
+            await update.message.reply_document(document=document, filename=os.path.basename(file_path))
+    finally:
+        os.remove(file_path) # Cleanup
+
+async def send_report_parts(update: Update, tickets, base_name: str) -> int:
+    """
+    Builds report parts in an executor thread and uploads each one as soon as it is
+    written. Returns the number of parts sent.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+
+    def produce():
+        try:
+            for path in generate_report_parts(
+                tickets, base_name, fmt=REPORT_FORMAT,
+                max_rows=REPORT_PART_ROWS, max_bytes=REPORT_PART_MAX_MB * 1024 * 1024,
+            ):
+                loop.call_soon_threadsafe(queue.put_nowait, path)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, None) # end of parts (or producer error)
+
+    producer = loop.run_in_executor(None, produce)
+    sent = 0
+    try:
+        while (path := await queue.get()) is not None:
+            await send_file(update, path)
+            sent += 1
+    except Exception:
+        # Upload failed: let the producer finish, then remove the parts that were never sent
+        await asyncio.gather(producer, return_exceptions=True)
+        while (path := queue.get_nowait()) is not None:
+            os.remove(path)
+        raise
+    await producer # re-raises any error from the report stage
+    return sent
+
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("Cancelled. Type /start to try again.")
     return ConversationHandler.END
@@ -97,41 +163,61 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # --- Helper Wrapper for Blocking Code ---
 import asyncio
 
+def sharded_details(shards, failed_domains):
+    for domain, tickets, matched_ids in shards:
+        if matched_ids is None:
+            logger.warning(f"{domain} failed; its tickets are missing from this report.")
+            failed_domains.append(domain)
+        for t in tickets:
+            yield t.id, t
+
 def run_scraper_logic(data):
+    """Returns (analyzed tickets, domains that failed and are missing from them)."""
     keyword = data['keyword']
     start_date = data.get('start_date')
     end_date = data.get('end_date')
-    intent = data.get('intent')
+    intents = parse_intents(data.get('intent'))
     
     # Init Logic
-    client = FreshdeskClient(FRESHDESK_DOMAIN, FRESHDESK_API_KEY)
     ai = TicketAnalyzer()
+    prompts = PromptBuilder()
+    failed_domains = []
     
-    found_tickets = client.search_tickets(keyword, start_date, end_date)
-    if not found_tickets:
-        return None
+    if len(FRESHDESK_ACCOUNTS) > 1:
+        # One process per domain; results are merged into one report with a Domain column
+        shards = fetch_all_domains(
+            FRESHDESK_ACCOUNTS, keyword, start_date, end_date, INTERACTIVE_RATE_LIMITS, FRESHDESK_MAX_WORKERS,
+        )
+        details = sharded_details(shards, failed_domains)
+    else:
+        domain, api_key = FRESHDESK_ACCOUNTS[0]
+        client = FreshdeskClient(domain, api_key, rate_limit=INTERACTIVE_RATE_LIMITS[domain], max_workers=FRESHDESK_MAX_WORKERS)
+        # Windows kept warm by the sync daemon are served from the local cache
+        cached = cached_search(CACHE_PATH, client.domain, keyword, start_date, end_date, CACHE_MAX_AGE_MINUTES)
+        if cached is not None:
+            logger.info(f"Serving {len(cached)} tickets from local cache.")
+            details = ((t.id, t) for t in cached)
+        else:
+            found_tickets = client.search_tickets(keyword, start_date, end_date)
+            ticket_ids = [t['id'] for t in found_tickets]
+            del found_tickets
+            details = client.get_tickets_details(ticket_ids, compact=True)
         
     detailed_tickets = []
-    for ticket in found_tickets:
-        t_id = ticket['id']
-        full_ticket = client.get_ticket_details(t_id)
-        
+    for t_id, full_ticket in details:
         if full_ticket:
             # AI Analysis
-            combined_text = f"Subject: {full_ticket.get('subject')}\nDesc: {full_ticket.get('description_text')}\n"
-            is_relevant, summary = ai.analyze(combined_text, intent)
-            full_ticket['ai_relevant'] = is_relevant
-            full_ticket['ai_summary'] = summary
+            combined_text = prompts.build(full_ticket)
+            full_ticket.apply_analysis(intents, ai.analyze_many(combined_text, intents))
             
             detailed_tickets.append(full_ticket)
-            
-    # Report
+    logger.info(prompts.stats_summary())
+    return detailed_tickets, failed_domains
+
+def report_base_name(keyword: str) -> str:
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     clean_kw = "".join([c for c in keyword if c.isalnum()])
-    filename = f"report_{clean_kw}_{timestamp}.xlsx"
-    generate_report(detailed_tickets, filename=filename)
-    
-    return filename
+    return f"report_{clean_kw}_{timestamp}"
 
 if __name__ == '__main__':
     if not TELEGRAM_BOT_TOKEN:
@@ -152,5 +238,9 @@ if __name__ == '__main__':
     
     application.add_handler(conv_handler)
     
+    if SYNC_ENABLED:
+        start_background_sync()
+        print("Background ticket sync started.")
+    
     print("Bot is polling (use webhooks in production for lower latency)...")
     application.run_polling()
@@ -1,6 +1,17 @@
+import os
+import tempfile
 import unittest
-from ai_processor import TicketAnalyzer
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+from ai_processor import TicketAnalyzer, parse_intents
 from freshdesk_client import FreshdeskClient
+from models import Ticket
+from ticket_cache import TicketCache, cached_search
+from sync_daemon import sync_once
+from config import SYNC_WINDOW_DAYS
+from prompt_builder import PromptBuilder, clean_message, count_tokens
+from saved_queries import SavedQueryStore
+from freshdesk_client import changed_ticket_ids
 
 class TestAdvancedFeatures(unittest.TestCase):
     def test_ai_fallback(self):
@@ -22,6 +33,41 @@ class TestAdvancedFeatures(unittest.TestCase):
             
         print("AI Processor Test: SUCCESS")
 
+    def test_multi_intent_keyword_mode(self):
+        analyzer = TicketAnalyzer()
+        analyzer.mode = "keyword"
+        intents = parse_intents("refund; login bug; refund ;")
+        self.assertEqual(intents, ["refund", "login bug"])
+
+        results = analyzer.analyze_many("Customer wants a refund after the crash.", intents)
+        self.assertEqual([relevant for relevant, _ in results], [True, False])
+
+    def test_multi_intent_single_call(self):
+        analyzer = TicketAnalyzer()
+        analyzer.mode = "openai"
+        response = '```json{"results": [{"intent": 2, "relevant": false, "summary": "No login issue."},' \
+                   ' {"intent": 1, "relevant": true, "summary": "Wants refund."}]}```'
+        with patch.object(analyzer, "_openai_generate", return_value=response) as generate:
+            results = analyzer.analyze_many("ticket", ["refund", "login bug", "api outage"])
+        generate.assert_called_once()
+        self.assertEqual(results[0], (True, "Wants refund."))
+        self.assertEqual(results[1], (False, "No login issue."))
+        self.assertEqual(results[2], (False, "No result returned for this intent."))
+
+    def test_multi_intent_bare_list_and_unparseable_response(self):
+        analyzer = TicketAnalyzer()
+        analyzer.mode = "openai"
+        bare = '[{"intent": 1, "relevant": false, "summary": "No refund."}, {"intent": 2, "relevant": true, "summary": "Login."}]'
+        with patch.object(analyzer, "_openai_generate", return_value=bare):
+            self.assertEqual(analyzer.analyze_many("ticket", ["refund", "login bug"]), [(False, "No refund."), (True, "Login.")])
+        with patch.object(analyzer, "_openai_generate", return_value="Both intents look relevant to me."):
+            results = analyzer.analyze_many("ticket", ["refund", "login bug"])
+        self.assertEqual([relevant for relevant, _ in results], [False, False])
+        # A single-intent shaped answer has no per-intent results
+        with patch.object(analyzer, "_openai_generate", return_value='{"relevant": true, "summary": "Refund."}'):
+            results = analyzer.analyze_many("ticket", ["refund", "login bug"])
+        self.assertEqual([relevant for relevant, _ in results], [False, False])
+
     def test_date_query_construction(self):
         """Verify the query string is built correctly with dates"""
         # We intercept the requests call to check params, but for now let's just assume the logic holds 
@@ -29,5 +75,200 @@ class TestAdvancedFeatures(unittest.TestCase):
         # Actually proper way: check the logic in a mock.
         pass
 
+class TestPromptBuilder(unittest.TestCase):
+    def _ticket(self, conversations):
+        return Ticket.from_api({
+            "id": 1, "subject": "App crash",
+            "description_text": "The app crashes when I open settings.\nThanks,\nJane\nSent from my iPhone",
+            "conversations": [{"body_text": text} for text in conversations],
+        })
+
+    def test_strips_quotes_signatures_and_duplicates(self):
+        ticket = self._ticket([
+            "Can you share your app version?\n\nOn Mon, Jan 1, 2024 at 10:00 Jane wrote:\n> The app crashes",
+            "Version 2.3.1\nThe app crashes when I open settings.\n-- \nJane Doe | Acme",
+        ])
+        prompt = PromptBuilder(token_budget=500).build(ticket)
+        self.assertIn("Description: The app crashes when I open settings.", prompt)
+        self.assertIn("Version 2.3.1", prompt)
+        self.assertEqual(prompt.count("The app crashes when I open settings."), 1)
+        for noise in ("Sent from my iPhone", "wrote:", "> The app", "Acme"):
+            self.assertNotIn(noise, prompt)
+
+    def test_keeps_sign_off_words_inside_the_message(self):
+        text = (
+            "Hi team,\nThanks,\nI cannot log in since the update.\nThe error says invalid token.\n"
+            "It happens on every device.\nPlease help.\nFrom: our IT admin, who also tried\nCheers,\nJane"
+        )
+        cleaned = clean_message(text, set())
+        self.assertIn("I cannot log in since the update.", cleaned)
+        self.assertIn("From: our IT admin", cleaned)
+        self.assertFalse(cleaned.endswith("Jane"))
+        quoted = clean_message("Any update?\nFrom: Support <help@acme.com>\nSent: Monday\nOld reply", set())
+        self.assertEqual(quoted, "Any update?")
+
+    def test_keeps_customer_text_that_mentions_footer_words(self):
+        text = "Please unsubscribe me from billing emails, I keep getting charged"
+        self.assertEqual(clean_message(text, set()), text)
+        footer = (
+            "Where is my refund?\nTo unsubscribe from these emails click here.\n"
+            "Please do not reply to this email.\nThis email is confidential and intended for the recipient only."
+        )
+        self.assertEqual(clean_message(footer, set()), "Where is my refund?")
+
+    def test_packs_latest_message_within_budget(self):
+        filler = [f"Update {i}: " + "still broken " * 40 for i in range(10)]
+        builder = PromptBuilder(token_budget=300)
+        prompt = builder.build(self._ticket(filler + ["Resolved after reinstalling."]))
+        self.assertLessEqual(count_tokens(prompt), 300)
+        self.assertIn("Resolved after reinstalling.", prompt)
+        self.assertIn("messages omitted", prompt)
+        self.assertGreater(builder.raw_tokens, builder.prompt_tokens)
+        self.assertIn("saved", builder.stats_summary())
+
+DOMAIN = "test.freshdesk.com"
+
+class TestTicketSync(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.cache = TicketCache(self.path)
+        self.today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def _record(self, t_id, subject, updated_at):
+        return Ticket.from_api({
+            "id": t_id, "subject": subject, "description_text": "body",
+            "created_at": f"{self.today}T08:00:00Z", "updated_at": updated_at,
+        })
+
+    def test_sync_fetches_only_changed_tickets(self):
+        self.cache.upsert([self._record(1, "Refund please", "2024-01-01T00:00:00Z")])
+        client = MagicMock(domain=DOMAIN)
+        client.list_tickets_updated_since.return_value = ([
+            {"id": 1, "updated_at": "2024-01-01T00:00:00Z"}, # unchanged
+            {"id": 2, "updated_at": "2024-01-02T00:00:00Z"}, # new
+        ], True)
+        client.get_tickets_details.return_value = iter([(2, self._record(2, "Login bug", f"{self.today}T09:00:00Z"))])
+
+        written = sync_once(client, self.cache, window_days=7)
+
+        self.assertEqual(written, 1)
+        client.get_tickets_details.assert_called_once_with([2], compact=True)
+        # Ticket 1 was last updated before the window, so it is pruned
+        self.assertEqual(list(self.cache.updated_at_by_id()), [2])
+        self.assertIsNotNone(self.cache.sync_state()[1])
+
+    def test_failed_or_partial_sync_is_not_marked(self):
+        client = MagicMock(domain=DOMAIN)
+        client.list_tickets_updated_since.return_value = (None, False)
+        with self.assertRaises(RuntimeError):
+            sync_once(client, self.cache, window_days=7)
+        self.assertEqual(self.cache.sync_state(), (None, None))
+
+        # A failed detail fetch leaves the cache unmarked too
+        client.list_tickets_updated_since.return_value = ([{"id": 2, "updated_at": "2024-01-02T00:00:00Z"}], True)
+        client.get_tickets_details.return_value = iter([(2, None)])
+        self.assertEqual(sync_once(client, self.cache, window_days=7), 0)
+        self.assertEqual(self.cache.sync_state(), (None, None))
+
+        # So does a listing that stopped at the page cap
+        client.list_tickets_updated_since.return_value = ([], False)
+        client.get_tickets_details.return_value = iter([])
+        sync_once(client, self.cache, window_days=7)
+        self.assertEqual(self.cache.sync_state(), (None, None))
+
+    def test_cached_search_covers_synced_window(self):
+        self.cache.upsert([self._record(3, "Refund please", f"{self.today}T09:00:00Z")])
+        self.assertIsNone(cached_search(self.path, DOMAIN, "refund", self.today, self.today, 30))
+
+        now = datetime.now(timezone.utc)
+        self.cache.mark_synced(
+            (now - timedelta(days=7)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            now.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            DOMAIN,
+        )
+        results = cached_search(self.path, DOMAIN, "refund", self.today, self.today, 30)
+        self.assertEqual([t.id for t in results], [3])
+        self.assertEqual(cached_search(self.path, DOMAIN, "login", self.today, None, 30), [])
+        # Windows older than the synced one (or "all time") still go to the API
+        self.assertIsNone(cached_search(self.path, DOMAIN, "refund", "2020-01-01", None, 30))
+        # A window starting mid-day only partly covers its first day
+        self.assertIsNone(cached_search(self.path, DOMAIN, "refund", (now - timedelta(days=7)).strftime("%Y-%m-%d"), None, 30))
+        self.assertIsNone(cached_search(self.path, DOMAIN, "refund", None, None, 30))
+        # Tickets synced from another domain are never served
+        self.assertIsNone(cached_search(self.path, "other.freshdesk.com", "refund", self.today, self.today, 30))
+
+    def test_sync_domain_change_clears_cache(self):
+        self.cache.upsert([self._record(1, "Refund please", f"{self.today}T09:00:00Z")])
+        self.cache.mark_synced("2024-01-01T00:00:00Z", "2024-01-02T00:00:00Z", "old.freshdesk.com")
+        client = MagicMock(domain=DOMAIN)
+        client.list_tickets_updated_since.return_value = ([], True)
+        client.get_tickets_details.return_value = iter([])
+        sync_once(client, self.cache, window_days=7)
+        self.assertEqual(self.cache.updated_at_by_id(), {})
+        self.assertEqual(self.cache.synced_domain(), DOMAIN)
+
+    def test_full_window_search_is_served_from_cache(self):
+        client = MagicMock(domain=DOMAIN)
+        client.list_tickets_updated_since.return_value = ([], True)
+        client.get_tickets_details.return_value = iter([])
+        sync_once(client, self.cache, window_days=SYNC_WINDOW_DAYS)
+        # "Last SYNC_WINDOW_DAYS days" starts exactly at the synced window's first (whole) day
+        start = (datetime.now(timezone.utc) - timedelta(days=SYNC_WINDOW_DAYS)).strftime("%Y-%m-%d")
+        self.assertTrue(self.cache.covers(DOMAIN, start, 30))
+        before = (datetime.now(timezone.utc) - timedelta(days=SYNC_WINDOW_DAYS + 1)).strftime("%Y-%m-%d")
+        self.assertFalse(self.cache.covers(DOMAIN, before, 30))
+
+class TestSavedQueries(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.store = SavedQueryStore(self.path)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def _record(self, t_id, updated_at, domain=None):
+        record = Ticket.from_api({"id": t_id, "subject": "Refund", "updated_at": updated_at})
+        record.domain = domain
+        record.apply_analysis(["refund"], [(True, f"Ticket {t_id}")])
+        return record
+
+    def test_delta_run_only_processes_changed_tickets(self):
+        self.store.save("daily", {"keyword": "refund", "start_date": None, "end_date": None, "intent": "refund"})
+        self.assertEqual(self.store.get("daily")["keyword"], "refund")
+        self.store.record_run("daily", [self._record(1, "A"), self._record(2, "A")], {("", 1), ("", 2)})
+
+        known = self.store.updated_at_by_domain("daily")
+        listing = [{"id": 1, "updated_at": "A"}, {"id": 2, "updated_at": "B"}, {"id": 3, "updated_at": "A"}]
+        self.assertEqual(changed_ticket_ids(listing, known[""]), [2, 3])
+
+        # Ticket 1 no longer matches the query, so it leaves the merged report
+        self.store.record_run("daily", [self._record(2, "B"), self._record(3, "A")], {("", 2), ("", 3)})
+        merged = self.store.load_tickets("daily")
+        self.assertEqual([(t.id, t.updated_at) for t in merged], [(2, "B"), (3, "A")])
+        self.assertEqual(merged[0].ai_summary, "Ticket 2")
+
+    def test_ticket_ids_are_scoped_per_domain(self):
+        self.store.save("multi", {"keyword": "refund", "start_date": None, "end_date": None, "intent": ""})
+        records = [self._record(1, "A", "us.freshdesk.com"), self._record(1, "B", "eu.freshdesk.com")]
+        self.store.record_run("multi", records, {("us.freshdesk.com", 1), ("eu.freshdesk.com", 1)})
+        known = self.store.updated_at_by_domain("multi")
+        self.assertEqual(known, {"us.freshdesk.com": {1: "A"}, "eu.freshdesk.com": {1: "B"}})
+        self.assertIsNone(self.store.get("missing"))
+
+    def test_failed_domain_keeps_its_tickets(self):
+        records = [self._record(1, "A", "us.freshdesk.com"), self._record(2, "A", "eu.freshdesk.com")]
+        self.store.record_run("multi", records, {("us.freshdesk.com", 1), ("eu.freshdesk.com", 2)})
+        # eu failed this run: nothing matched there is known, so its rows stay
+        self.store.record_run("multi", [], {("us.freshdesk.com", 1)}, failed_domains=["eu.freshdesk.com"])
+        self.assertEqual([(t.domain, t.id) for t in self.store.load_tickets("multi")],
+                         [("eu.freshdesk.com", 2), ("us.freshdesk.com", 1)])
+        # Cached records are compared the same way as listing dicts
+        self.assertEqual(changed_ticket_ids(records, {1: "A", 2: "B"}), [2])
+
 if __name__ == '__main__':
     unittest.main()
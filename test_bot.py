@@ -1,6 +1,8 @@
 import unittest
 from unittest.mock import AsyncMock, MagicMock, patch
+import os
 import telegram_bot  # Import the module to test
+from models import Ticket
 
 class TestTelegramBot(unittest.IsolatedAsyncioTestCase):
     async def test_start_command(self):
@@ -30,5 +32,38 @@ class TestTelegramBot(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(context.user_data['keyword'], 'refund')
         print("Test Keyword Handler: SUCCESS")
 
+    async def test_send_report_parts(self):
+        update = MagicMock()
+        uploaded = []
+
+        async def reply_document(document, filename):
+            uploaded.append(filename)
+        update.message.reply_document = reply_document
+
+        tickets = [Ticket.from_api({"id": i, "subject": "Refund"}) for i in range(5)]
+        with patch.object(telegram_bot, "REPORT_PART_ROWS", 2):
+            parts = await telegram_bot.send_report_parts(update, tickets, "test_bot_report")
+
+        self.assertEqual(parts, 3)
+        self.assertEqual(uploaded, [f"test_bot_report_part{i}.csv.zip" for i in (1, 2, 3)])
+        self.assertFalse(any(os.path.exists(name) for name in uploaded))
+        print("Test Report Parts Upload: SUCCESS")
+
+    async def test_intent_handler_reports_failed_domains(self):
+        update = MagicMock()
+        update.message.text = "skip"
+        update.message.reply_text = AsyncMock()
+        context = MagicMock()
+        context.user_data = {"keyword": "refund"}
+        accounts = [("us.freshdesk.com", "k1"), ("eu.freshdesk.com", "k2")]
+
+        with patch.object(telegram_bot, "FRESHDESK_ACCOUNTS", accounts), \
+                patch.object(telegram_bot, "run_scraper_logic", return_value=([], ["eu.freshdesk.com", "us.freshdesk.com"])):
+            await telegram_bot.intent_handler(update, context)
+
+        replies = [call.args[0] for call in update.message.reply_text.call_args_list]
+        self.assertIn("eu.freshdesk.com, us.freshdesk.com", replies[1])
+        self.assertIn("Every Freshdesk domain failed", replies[2])
+
 if __name__ == '__main__':
     unittest.main()
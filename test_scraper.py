@@ -2,7 +2,12 @@ import unittest
 from unittest.mock import MagicMock, patch
 import json
 from freshdesk_client import FreshdeskClient
-from report_generator import generate_report
+from report_generator import fits_single_report, generate_report, generate_report_parts
+import zipfile
+import io
+from models import Ticket
+from sharded_scraper import fetch_domain_tickets
+from config import _parse_accounts
 import os
 import pandas as pd
 
@@ -43,6 +48,86 @@ class TestFreshdeskScraper(unittest.TestCase):
         self.assertEqual(len(details['conversations']), 2)
         print("Test Get Details: SUCCESS")
 
+    @patch('requests.Session.get')
+    def test_get_ticket_details_long_thread(self, mock_get):
+        # Embedded conversations hit the limit, so the full thread is paged in
+        embedded = [{"id": i, "body_text": f"Msg {i}"} for i in range(10)]
+        page1 = [{"id": i, "body_text": f"Msg {i}"} for i in range(100)]
+        page2 = [{"id": i, "body_text": f"Msg {i}"} for i in range(100, 130)]
+        mock_get.side_effect = [
+            MagicMock(status_code=200, json=lambda: {"id": 7, "conversations": embedded}),
+            MagicMock(status_code=200, json=lambda: page1),
+            MagicMock(status_code=200, json=lambda: page2),
+        ]
+        details = self.client.get_ticket_details(7)
+        self.assertEqual(len(details['conversations']), 130)
+        self.assertEqual(mock_get.call_count, 3)
+        self.assertTrue(mock_get.call_args_list[1][0][0].endswith("/tickets/7/conversations"))
+        print("Test Long Thread Pagination: SUCCESS")
+
+    @patch('requests.Session.get')
+    def test_get_tickets_details_bulk(self, mock_get):
+        def fake_get(url, params=None):
+            t_id = int(url.rsplit("/", 1)[1])
+            return MagicMock(status_code=200, json=lambda: {"id": t_id, "conversations": []})
+        mock_get.side_effect = fake_get
+
+        results = list(self.client.get_tickets_details([3, 1, 2]))
+        self.assertEqual([t_id for t_id, _ in results], [3, 1, 2])
+        self.assertEqual([d['id'] for _, d in results], [3, 1, 2])
+        # Short threads never touch the conversations endpoint
+        self.assertEqual(mock_get.call_count, 3)
+        print("Test Bulk Details: SUCCESS")
+
+    @patch('requests.Session.get')
+    def test_get_ticket_details_compact(self, mock_get):
+        mock_ticket = {
+            "id": 5,
+            "subject": "Refund",
+            "description": "<p>Please refund</p>",
+            "description_text": "Please refund",
+            "custom_fields": {"cf_plan": "pro"},
+            "attachments": [{"name": "a.png"}],
+            "conversations": [
+                {"body": "<div>Done &amp; closed</div>", "body_text": "Done & closed", "private": True, "user_id": 9}
+            ]
+        }
+        mock_get.return_value = MagicMock(status_code=200, json=lambda: mock_ticket)
+
+        record = self.client.get_ticket_details(5, compact=True)
+        self.assertIsInstance(record, Ticket)
+        self.assertEqual(record.description, "Please refund")
+        self.assertEqual(record.conversations[0].text, "Done & closed")
+        self.assertTrue(record.conversations[0].private)
+        self.assertFalse(hasattr(record, "__dict__"))
+        print("Test Compact Details: SUCCESS")
+
+    @patch('requests.Session.get')
+    def test_fetch_domain_tickets(self, mock_get):
+        listing = [{"id": 1, "subject": "Refund now", "created_at": "2024-01-01T00:00:00Z"},
+                   {"id": 2, "subject": "Other", "created_at": "2024-01-01T00:00:00Z"}]
+        mock_get.side_effect = [
+            MagicMock(status_code=200, json=lambda: listing),
+            MagicMock(status_code=200, json=lambda: {"id": 1, "subject": "Refund now", "conversations": []}),
+        ]
+        tickets, matched_ids = fetch_domain_tickets("eu.freshdesk.com", "key", "refund", None, None, 100, 2)
+        self.assertEqual(matched_ids, [1])
+        self.assertEqual([t.id for t in tickets], [1])
+        self.assertEqual(tickets[0].domain, "eu.freshdesk.com")
+
+    @patch('requests.Session.get')
+    def test_search_listing_failure_raises(self, mock_get):
+        mock_get.return_value = MagicMock(status_code=500, text="Server Error")
+        client = FreshdeskClient("test.freshdesk.com", "key", rate_limit=6000)
+        # A failed listing must not look like "no matches" (saved queries would drop their tickets)
+        with self.assertRaises(RuntimeError):
+            client.search_tickets("refund")
+
+    def test_parse_accounts(self):
+        accounts = _parse_accounts("us.freshdesk.com:key1, eu.freshdesk.com:key2,broken")
+        self.assertEqual(accounts, [("us.freshdesk.com", "key1"), ("eu.freshdesk.com", "key2")])
+        self.assertEqual(_parse_accounts(None), [])
+
     def test_report_generation(self):
         # Create dummy data
         tickets = [
@@ -75,5 +160,88 @@ class TestFreshdeskScraper(unittest.TestCase):
             
         print("Test Report Generation: SUCCESS")
 
+    def test_report_generation_compact(self):
+        record = Ticket.from_api({
+            "id": 2,
+            "subject": "Compact",
+            "created_at": "2023-01-01",
+            "description": "<b>Initial</b> Problem",
+            "conversations": [{"body": "<p>Reply 1</p>", "user_id": 2, "private": True}]
+        })
+        record.ai_relevant = True
+        record.ai_summary = "User reports a problem."
+
+        filename = "test_report_compact.xlsx"
+        generate_report([record], filename)
+        try:
+            df = pd.read_excel(filename)
+            self.assertIn("Initial Problem", df.iloc[0]['Full Conversation'])
+            self.assertIn("NOTE from 2", df.iloc[0]['Full Conversation'])
+            self.assertEqual(df.iloc[0]['AI Summary'], "User reports a problem.")
+        finally:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def test_report_generation_multi_intent(self):
+        record = Ticket.from_api({"id": 3, "subject": "Refund", "description_text": "Refund please"})
+        record.apply_analysis(["refund", "login bug"], [(True, "Wants refund."), (False, "Unrelated.")])
+
+        filename = "test_report_multi.xlsx"
+        generate_report([record], filename)
+        try:
+            df = pd.read_excel(filename)
+            self.assertTrue(df.iloc[0]['AI Relevance'])
+            self.assertEqual(df.iloc[0]['Summary: refund'], "Wants refund.")
+            self.assertFalse(df.iloc[0]['Relevance: login bug'])
+            self.assertNotIn("AI Summary", df.columns)
+            self.assertNotIn("Domain", df.columns)
+        finally:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def test_report_generation_domain_column(self):
+        records = [Ticket.from_api({"id": 1, "subject": "A"}), Ticket.from_api({"id": 1, "subject": "B"})]
+        records[0].domain, records[1].domain = "us.freshdesk.com", "eu.freshdesk.com"
+
+        filename = "test_report_domains.xlsx"
+        generate_report(records, filename)
+        try:
+            df = pd.read_excel(filename)
+            self.assertEqual(list(df.columns[:2]), ["Domain", "Ticket ID"])
+            self.assertEqual(list(df['Domain']), ["us.freshdesk.com", "eu.freshdesk.com"])
+        finally:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def test_report_parts_split_and_compressed(self):
+        records = [Ticket.from_api({"id": i, "subject": f"Ticket {i}", "description_text": "x" * 50}) for i in range(25)]
+        paths = list(generate_report_parts(records, "test_parts", fmt="csv.zip", max_rows=10))
+        try:
+            self.assertEqual(paths, [f"test_parts_part{i}.csv.zip" for i in (1, 2, 3)])
+            with zipfile.ZipFile(paths[2]) as archive:
+                df = pd.read_csv(io.BytesIO(archive.read("test_parts_part3.csv")))
+            self.assertEqual(list(df['Ticket ID']), list(range(20, 25)))
+            self.assertIn("Full Conversation", df.columns)
+        finally:
+            for path in paths:
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def test_report_parts_size_threshold(self):
+        records = [Ticket.from_api({"id": i, "description_text": "x" * 1000}) for i in range(6)]
+        paths = list(generate_report_parts(records, "test_sized", max_rows=100, max_bytes=2000))
+        try:
+            self.assertEqual(len(paths), 3)
+        finally:
+            for path in paths:
+                os.remove(path)
+
+    def test_fits_single_report(self):
+        records = [Ticket.from_api({"id": i, "description_text": "x" * 1000}) for i in range(6)]
+        self.assertTrue(fits_single_report(records, max_rows=10, max_bytes=100000))
+        self.assertFalse(fits_single_report(records, max_rows=5, max_bytes=100000))
+        # Few rows, but too much text for one file
+        self.assertFalse(fits_single_report(records, max_rows=10, max_bytes=2000))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,126 @@
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from freshdesk_client import keyword_terms, matches_keyword
+from models import Ticket
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+class TicketCache:
+    """
+    SQLite store of compact ticket records kept fresh by the sync daemon.
+    A new connection is opened per call so the bot and the sync thread can share it.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS tickets ("
+                "id INTEGER PRIMARY KEY, created_at TEXT, updated_at TEXT, data TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tickets_created ON tickets (created_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn: # commits on success
+                yield conn
+        finally:
+            conn.close()
+
+    def upsert(self, tickets: Iterable[Ticket]):
+        rows = [(t.id, t.created_at, t.updated_at, json.dumps(t.to_dict())) for t in tickets]
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO tickets VALUES (?, ?, ?, ?)", rows)
+
+    def updated_at_by_id(self) -> Dict[int, str]:
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT id, updated_at FROM tickets"))
+
+    def prune(self, updated_before: str) -> int:
+        """Drops tickets last updated before the sync window."""
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM tickets WHERE updated_at < ?", (updated_before,)).rowcount
+
+    def clear(self):
+        """Drops every ticket and the sync state (e.g. when the synced domain changes)."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM tickets")
+            conn.execute("DELETE FROM meta")
+
+    def mark_synced(self, window_start: str, synced_at: str, domain: str):
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                [("window_start", window_start), ("last_synced_at", synced_at), ("domain", domain)],
+            )
+
+    def synced_domain(self) -> Optional[str]:
+        """The Freshdesk domain the cached tickets were synced from."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'domain'").fetchone()
+        return row[0] if row else None
+
+    def sync_state(self) -> Tuple[Optional[str], Optional[str]]:
+        """Returns (window_start, last_synced_at) of the last successful sync."""
+        with self._connect() as conn:
+            meta = dict(conn.execute("SELECT key, value FROM meta"))
+        return meta.get("window_start"), meta.get("last_synced_at")
+
+    def covers(self, domain: str, start_date: Optional[str], max_age_minutes: int) -> bool:
+        """
+        True if every ticket of `domain` created since `start_date` (YYYY-MM-DD) is in the cache:
+        it was synced from that domain, the synced window starts on or before that date
+        and the last sync is recent.
+        """
+        window_start, last_synced_at = self.sync_state()
+        if not start_date or not window_start or not last_synced_at:
+            return False
+        if self.synced_domain() != domain:
+            return False
+        synced = datetime.strptime(last_synced_at, TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc)
+        if datetime.now(timezone.utc) - synced > timedelta(minutes=max_age_minutes):
+            return False
+        # Compared as timestamps: a window that starts mid-day only partly covers its first day
+        return f"{start_date}T00:00:00Z" >= window_start
+
+    def search(self, keyword: str, start_date: Optional[str] = None, end_date: Optional[str] = None) -> List[Ticket]:
+        """Same matching as `FreshdeskClient.search_tickets`, served from the cache."""
+        query = "SELECT data FROM tickets WHERE 1=1"
+        params = []
+        if start_date:
+            query += " AND substr(created_at, 1, 10) >= ?"
+            params.append(start_date)
+        if end_date:
+            query += " AND substr(created_at, 1, 10) <= ?"
+            params.append(end_date)
+        query += " ORDER BY created_at"
+        terms = keyword_terms(keyword)
+        tickets = []
+        with self._connect() as conn:
+            for (data,) in conn.execute(query, params):
+                ticket = Ticket.from_dict(json.loads(data))
+                if not terms or matches_keyword(terms, ticket.subject, ticket.description):
+                    tickets.append(ticket)
+        return tickets
+
+
+def cached_search(path: str, domain: str, keyword: str, start_date: Optional[str], end_date: Optional[str],
+                  max_age_minutes: int) -> Optional[List[Ticket]]:
+    """
+    Returns matching tickets of `domain` from the local cache, or None if the cache does
+    not cover that domain and the requested window (caller falls back to the API).
+    """
+    if not os.path.exists(path):
+        return None
+    cache = TicketCache(path)
+    if not cache.covers(domain, start_date, max_age_minutes):
+        return None
+    return cache.search(keyword, start_date, end_date)